@@ -1,25 +1,117 @@
 from __future__ import annotations
 
-import contextlib
+import copy
 import csv
 import itertools as it
-import pprint
-import urllib.request
+import os
+import re
+import time
 from pathlib import Path
-from typing import Callable, Dict, Optional, Tuple, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from lazylines.budget import (
+    MemoryBudget,
+    MemoryBudgetError,
+    SpilledItems,
+    TrackedList,
+    budgeted_tee,
+    external_group,
+    external_sort,
+    get_memory_budget,
+    materialize,
+    set_memory_budget,
+)
+
+
+class Checkpoint:
+    """
+    Keeps track of how far an append-only .jsonl file has been processed.
+
+    A checkpoint stores the byte offset of the last complete line that was read
+    together with the serialized state of aggregations (`.agg()`) and groupings
+    (`.nest_by()`). On the next run only the newly appended lines are processed
+    and the results are combined with the stored state.
+
+    The offset is shared by all stages that use the checkpoint. When more than one
+    stage stores its state in it, pass `save=False` to those stages and call `.save()`
+    once after all of them ran. Otherwise a crash between two stages stores an offset
+    that the later stage hasn't processed yet, and it silently skips those lines.
+
+    Keep in mind that `.nest_by()` stores every grouped item in the checkpoint, so
+    each run writes all items seen so far and not only the new ones. The state is
+    stored as JSON, which means that tuples come back as lists and that dictionary
+    keys come back as strings.
+
+    Arguments:
+        path: path to the .json file that holds the checkpoint, it is created when it doesn't exist
+
+    Usage:
+
+    ```python
+    from lazylines import Checkpoint, read_jsonl
+    from lazylines.functions import calc_mean, count
+
+    checkpoint = Checkpoint("annotations.checkpoint.json")
+    stats = read_jsonl("annotations.jsonl", checkpoint=checkpoint).agg(count(), checkpoint=checkpoint)
+
+    # Several stages that share a checkpoint save it once at the end
+    lines1, lines2 = read_jsonl("annotations.jsonl", checkpoint=checkpoint).tee()
+    counts = lines1.agg(count(), checkpoint=checkpoint, save=False)
+    means = lines2.agg(calc_mean("score"), checkpoint=checkpoint, save=False)
+    checkpoint.save()
+    ```
+    """
+
+    def __init__(self, path: str | Path):
+        import srsly
+
+        self.path = Path(path)
+        self.offset = 0
+        self.state = {}
+        if self.path.exists():
+            data = srsly.read_json(self.path)
+            self.offset = data["offset"]
+            self.state = data["state"]
+
+    def save(self) -> None:
+        """Write the checkpoint to disk, atomically replacing the previous one."""
+        import srsly
+
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        srsly.write_json(tmp_path, {"offset": self.offset, "state": self.state})
+        os.replace(tmp_path, self.path)
+
+
+def _read_new_lines(path: str | Path, checkpoint: Checkpoint):
+    import srsly
 
-import srsly
-import tqdm
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < checkpoint.offset:
+            raise ValueError(f"{path} is smaller than the checkpoint offset, it seems to be truncated or replaced.")
+        f.seek(checkpoint.offset)
+        for line in f:
+            # A line without a newline is still being written, it will be picked up next time.
+            if not line.endswith(b"\n"):
+                break
+            checkpoint.offset += len(line)
+            if line.strip():
+                yield srsly.json_loads(line)
 
 
-def read_jsonl(path: str | Path) -> LazyLines:
+def read_jsonl(path: str | Path, checkpoint: Checkpoint | None = None) -> LazyLines:
     """
     Read .jsonl file and turn it into a LazyLines object.
 
     Supports both local files and URLs (http/https).
 
+    When a `Checkpoint` is passed, it is only written to disk by `.agg(checkpoint=...)`,
+    `.nest_by(checkpoint=...)` or by calling `checkpoint.save()` yourself. Ending the
+    pipeline with `.collect()` or `.write_jsonl()` moves the offset in memory but doesn't save it.
+
     Arguments:
         path: Local file path or URL to a .jsonl file
+        checkpoint: Optional `Checkpoint`, only lines appended after its offset are read and the offset is moved forward
 
     Usage:
 
@@ -33,20 +125,122 @@ def read_jsonl(path: str | Path) -> LazyLines:
     lines = read_jsonl("https://calmcode.io/static/data/pokemon.jsonl")
     ```
     """
+    import srsly
+
     path_str = str(path)
     if path_str.startswith(("https:", "http:")):
+        if checkpoint is not None:
+            raise ValueError("Checkpoints are only supported for local files.")
+
         # Handle URL
         def url_gen():
+            import urllib.request
+
             with urllib.request.urlopen(path_str) as resp:  # nosec
                 for line in resp:
                     yield srsly.json_loads(line.decode().strip())
 
         return LazyLines(url_gen())
+    elif checkpoint is not None:
+        return LazyLines(_read_new_lines(path, checkpoint))
     else:
         # Handle local file
         return LazyLines(srsly.read_jsonl(path))
 
 
+def follow_jsonl(
+    path: str | Path,
+    checkpoint: Checkpoint | None = None,
+    poll_interval: float = 1.0,
+    timeout: float | None = None,
+) -> LazyLines:
+    """
+    Follow a local .jsonl file, much like `tail -f`, and yield new lines as they are appended.
+
+    Arguments:
+        path: Local file path to a .jsonl file
+        checkpoint: Optional `Checkpoint`, reading starts at its offset and the offset is moved forward
+        poll_interval: number of seconds to wait before checking the file for new lines
+        timeout: stop after this many seconds without new lines, follows forever when `None`
+
+    Usage:
+
+    ```python
+    from lazylines import follow_jsonl
+
+    for item in follow_jsonl("annotations.jsonl", timeout=60):
+        print(item)
+    ```
+    """
+
+    def follow_gen():
+        import srsly
+
+        offset = 0 if checkpoint is None else checkpoint.offset
+        idle = 0.0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                line = f.readline()
+                if line.endswith(b"\n"):
+                    offset += len(line)
+                    if checkpoint is not None:
+                        checkpoint.offset = offset
+                    idle = 0.0
+                    if line.strip():
+                        yield srsly.json_loads(line)
+                    continue
+                # Rewind any partially written line and wait for the writer to finish it.
+                f.seek(offset)
+                if timeout is not None and idle >= timeout:
+                    return
+                time.sleep(poll_interval)
+                idle += poll_interval
+
+    return LazyLines(follow_gen())
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Arrow and Parquet support requires pyarrow, install it via `pip install lazylines[arrow]`."
+        ) from e
+    return pyarrow
+
+
+def read_parquet(path: str | Path, columns: list[str] | None = None, batch_size: int = 10_000) -> LazyLines:
+    """
+    Read a Parquet file and turn it into a LazyLines object.
+
+    The file is read in record batches, so only one batch is kept in memory at a time.
+    Requires `pyarrow`, which can be installed via `pip install lazylines[arrow]`.
+
+    Arguments:
+        path: Local file path to a Parquet file
+        columns: Only read these columns, the other columns are never loaded from disk
+        batch_size: the number of rows to read per record batch
+
+    Usage:
+
+    ```python
+    from lazylines import read_parquet
+
+    lines = read_parquet("data.parquet", columns=["name", "age"])
+    ```
+    """
+    pa = _import_pyarrow()
+    parquet_file = pa.parquet.ParquetFile(path)
+
+    def parquet_gen():
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield from batch.to_pylist()
+
+    return LazyLines(parquet_gen())
+
+
 def read_csv(
     path: str | Path,
     delimiter: str = ",",
@@ -79,6 +273,8 @@ def read_csv(
     if path_str.startswith(("https:", "http:")):
         # Handle URL
         def url_gen():
+            import urllib.request
+
             with urllib.request.urlopen(path_str) as resp:  # nosec
                 # Get fieldnames from first line if not provided
                 nonlocal fieldnames
@@ -103,6 +299,30 @@ def read_csv(
         return LazyLines(file_gen())
 
 
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def _parse_duration(duration: str | int | float, allow_zero: bool = False):
+    """Turn a duration like `"90s"`, `"15m"`, `"1h"`, `"1d"` or a number of seconds into seconds."""
+    if isinstance(duration, (int, float)):
+        seconds = duration
+    else:
+        match = re.fullmatch(r"\s*(\d+)\s*([smhdw])\s*", duration)
+        if match is None:
+            raise ValueError(f"Duration must look like '30s', '15m', '1h', '1d' or '1w', got {duration!r}.")
+        seconds = int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+    if seconds < 0 or (seconds == 0 and not allow_zero):
+        raise ValueError(f"Duration must be positive, got {duration!r}.")
+    return seconds
+
+
+def _nested(keys: tuple, key: tuple, values: list) -> dict:
+    for value in values:
+        for arg in keys:
+            del value[arg]
+    return {**dict(zip(keys, key)), "subset": values}
+
+
 class LazyLines:
     """
     An object that can wrangle iterables of dictionaries (similar to JSONL).
@@ -110,11 +330,36 @@ class LazyLines:
     ```python
     from lazylines import LazyLines
     ```
+
+    Arguments:
+        g: an iterable of dictionaries
+        budget: optional `MemoryBudget` for this pipeline, the one from `set_memory_budget()` is used otherwise
     """
 
-    def __init__(self, g):
+    def __init__(self, g, budget: MemoryBudget | None = None):
         self.g = g
         self.groups = set()
+        self.budget = budget
+
+    def _memory_budget(self) -> MemoryBudget | None:
+        return self.budget if self.budget is not None else get_memory_budget()
+
+    def with_budget(self, budget: MemoryBudget | None) -> LazyLines:
+        """
+        Sets the memory budget for the verbs that materialize the stream from here on.
+
+        Arguments:
+            budget: the `MemoryBudget` to use, `None` falls back to the one from `set_memory_budget()`
+
+        ```python
+        from lazylines import LazyLines, MemoryBudget
+
+        budget = MemoryBudget("100MB", policy="raise")
+        items = LazyLines({"a": i} for i in range(100)).with_budget(budget).cache()
+        assert budget.current > 0
+        ```
+        """
+        return LazyLines(g=self.g, budget=budget)
 
     def cache(self) -> LazyLines:
         """
@@ -131,8 +376,15 @@ class LazyLines:
         # is now a list which might speedup repeated downstream tasks
         cached = (LazyLines(items).cache())
         ```
+
+        When a `MemoryBudget` is active, the cached items count towards it for as long
+        as they are kept around and they are spilled to disk if the budget asks for it.
         """
-        return LazyLines(g=list(self.g))
+        budget = self._memory_budget()
+        items, nbytes = materialize(self.g, "cache", budget)
+        if nbytes:
+            budget.hold(items, nbytes)
+        return LazyLines(g=items, budget=self.budget)
 
     def mutate(self, **kwargs: dict[str, Callable]) -> LazyLines:
         """
@@ -159,7 +411,7 @@ class LazyLines:
                     item[k] = v(item)
                 yield item
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def keep(self, *args: Callable) -> LazyLines:
         """
@@ -189,7 +441,7 @@ class LazyLines:
                 if allowed:
                     yield item
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def unnest(self, key: str = "subset") -> LazyLines:
         """
@@ -229,7 +481,7 @@ class LazyLines:
                     d = {**value, **orig}
                     yield d
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def explode(self, key: str) -> LazyLines:
         """
@@ -263,7 +515,7 @@ class LazyLines:
                     d = {**orig, key: value}
                     yield d
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def head(self, n=5) -> LazyLines:
         """
@@ -272,15 +524,7 @@ class LazyLines:
         Arguments:
             n: the number of examples to take
         """
-        if isinstance(self.g, list):
-            return LazyLines(g=(i for i in self.g[:5]))
-
-        def new_gen():
-            for _ in range(n):
-                with contextlib.suppress(StopIteration):
-                    yield next(self.g)
-
-        return LazyLines(g=new_gen())
+        return LazyLines(g=it.islice(self.g, n), budget=self.budget)
 
     def show(self, n: int = 1) -> LazyLines:
         """
@@ -289,10 +533,12 @@ class LazyLines:
         Arguments:
             n: the number of examples to preview
         """
+        import pprint
+
         stream_orig, stream_copy = it.tee(self.g)
         for _ in range(n):
             pprint.pprint(next(stream_copy))
-        return LazyLines(g=stream_orig)
+        return LazyLines(g=stream_orig, budget=self.budget)
 
     def map(self, func: Callable) -> LazyLines:
         """
@@ -306,7 +552,7 @@ class LazyLines:
             for item in self.g:
                 yield func(item)
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def tee(self, n: int = 2) -> tuple[LazyLines]:
         """
@@ -330,8 +576,13 @@ class LazyLines:
         lines1, lines2 = LazyLines(data).tee(n=2)
         lines1, lines2, lines3 = LazyLines(data).tee(n=3)
         ```
+
+        When a `MemoryBudget` is active, the items that are buffered because one copy
+        is ahead of another count towards it. These can't be spilled to disk.
         """
-        return tuple(LazyLines(g=gen) for gen in it.tee(self.g, n))
+        budget = self._memory_budget()
+        gens = it.tee(self.g, n) if budget is None else budgeted_tee(self.g, n, "tee", budget)
+        return tuple(LazyLines(g=gen, budget=self.budget) for gen in gens)
 
     def __iter__(self):
         return iter(self.g)
@@ -340,10 +591,24 @@ class LazyLines:
         """
         Sort the items based on a subset of the keys.
 
+        When a `MemoryBudget` with the `"spill"` policy runs out, the items are sorted
+        on disk in chunks which are merged afterwards.
+
         Arguments:
             keys: the keys to use for sorting
         """
-        return LazyLines(g=sorted(self.g, key=lambda d: tuple([d[c] for c in keys])))
+
+        def sort_key(d):
+            return tuple([d[c] for c in keys])
+
+        budget = self._memory_budget()
+        if budget is None:
+            return LazyLines(g=sorted(self.g, key=sort_key), budget=self.budget)
+        items, nbytes = materialize(self.g, "sort_by", budget)
+        if isinstance(items, SpilledItems):
+            return LazyLines(g=external_sort(items, sort_key, budget), budget=self.budget)
+        items.sort(key=sort_key)
+        return LazyLines(g=budget.hold(items, nbytes), budget=self.budget)
 
     def rename(self, **kwargs: dict[str, str]) -> LazyLines:
         """
@@ -382,16 +647,22 @@ class LazyLines:
                 new = {k: item[v] for k, v in kwargs.items()}
                 yield {**old, **new}
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
-    def nest_by(self, *keys: str) -> LazyLines:
+    def nest_by(self, *keys: str, checkpoint: Checkpoint | None = None, save: bool = True) -> LazyLines:
         """
         Group by keys and return nested collections.
 
         The opposite of `.unnest()`
 
+        When a `MemoryBudget` with the `"spill"` policy runs out, the items are grouped
+        on disk, one partition at a time. The groups then come out partition by partition
+        instead of in order of appearance.
+
         Arguments:
             keys: the keys to nest by
+            checkpoint: Optional `Checkpoint`, groups from previous runs are restored from it and it is saved afterwards
+            save: whether to write the checkpoint to disk afterwards, see `Checkpoint` for when not to
 
         **Usage**:
 
@@ -419,27 +690,143 @@ class LazyLines:
         ```
         """
         groups = {}
-        for example in self.g:
-            key = tuple(example.get(arg, None) for arg in keys)
+        state_key = "nest_by:" + ",".join(keys)
+        if checkpoint is not None:
+            for group in checkpoint.state.get(state_key, []):
+                groups[tuple(group[k] for k in keys)] = group["subset"]
+
+        def group_key(example):
+            return tuple(example.get(arg, None) for arg in keys)
+
+        budget = self._memory_budget()
+        examples, nbytes = (self.g, 0) if budget is None else materialize(self.g, "nest_by", budget)
+        if isinstance(examples, SpilledItems):
+            spilled_groups = external_group(examples, group_key, budget)
+            if checkpoint is None:
+                return LazyLines(g=(_nested(keys, key, values) for key, values in spilled_groups), budget=self.budget)
+            for key, values in spilled_groups:
+                groups.setdefault(key, []).extend(_nested(keys, key, values)["subset"])
+            examples = []
+        for example in examples:
+            key = group_key(example)
             if key not in groups:
                 groups[key] = []
             for arg in keys:
                 del example[arg]
             groups[key].append(example)
-        result = []
+        result = TrackedList()
         for key, values in groups.items():
             result.append({**dict(zip(keys, key)), "subset": values})
-        return LazyLines(result)
+        if checkpoint is not None:
+            checkpoint.state[state_key] = result
+            if save:
+                checkpoint.save()
+        if nbytes:
+            budget.hold(result, nbytes)
+        return LazyLines(result, budget=self.budget)
+
+    def window(
+        self,
+        ts_key: str,
+        every: str | int = "1h",
+        period: str | int | None = None,
+        aggs: tuple = (),
+        offset: str | int = 0,
+    ) -> LazyLines:
+        """
+        Aggregates the items in tumbling or sliding time windows.
+
+        The items need to be ordered by the timestamp in `ts_key`, which should be a unix
+        timestamp in seconds. A window is yielded as soon as an item arrives that falls
+        after it, so only the windows that are still open are kept in memory. Windows
+        without items are skipped.
+
+        Windows start at multiples of `every` counted from the unix epoch, which is in UTC.
+        Because the epoch fell on a Thursday, weekly windows start on Thursdays unless you
+        pass `offset="4d"`, which makes them start on Mondays. Unlike `round_timestamp`,
+        windows don't take the local timezone into account.
+
+        Arguments:
+            ts_key: the key that contains the unix timestamp
+            every: how often a window starts, like `"30s"`, `"15m"`, `"1h"`, `"1d"`, `"1w"` or a number of seconds
+            period: the length of each window, defaults to `every` which gives tumbling windows
+            aggs: the aggregations to calculate per window, like `calc_mean("foo")` or `count()`
+            offset: shifts the start of the windows away from the multiples of `every`
+
+        ```python
+        from lazylines import LazyLines
+        from lazylines.functions import count
+
+        data = [{"ts": 0}, {"ts": 1800}, {"ts": 3600}, {"ts": 9000}]
+
+        tumbling = LazyLines(data).window("ts", every="1h", aggs=[count()]).collect()
+        assert tumbling == [
+            {"window_start": 0, "window_end": 3600, "count": 2},
+            {"window_start": 3600, "window_end": 7200, "count": 1},
+            {"window_start": 7200, "window_end": 10800, "count": 1},
+        ]
+
+        # Windows of two hours that start every hour
+        sliding = LazyLines(data).window("ts", every="1h", period="2h", aggs=[count()]).collect()
+        assert [(d["window_start"], d["count"]) for d in sliding] == [(-3600, 2), (0, 3), (3600, 2), (7200, 1)]
+        ```
+        """
+        every_s = _parse_duration(every)
+        period_s = every_s if period is None else _parse_duration(period)
+        offset_s = _parse_duration(offset, allow_zero=True) % every_s
+
+        def close(start, accumulators):
+            values = {name: value for name, (_, value) in accumulators.items()}
+            return {"window_start": start, "window_end": start + period_s, **values}
+
+        def new_gen():
+            open_windows = {}
+            last_ts = None
+            for ex in self.g:
+                ts = ex[ts_key]
+                if last_ts is not None and ts < last_ts:
+                    raise ValueError(f"Items need to be ordered by `{ts_key}`, got {ts} after {last_ts}.")
+                last_ts = ts
+                # Windows are opened in order of their start, so the oldest ones are up front.
+                while open_windows:
+                    start = next(iter(open_windows))
+                    if start + period_s > ts:
+                        break
+                    yield close(start, open_windows.pop(start))
+                starts = []
+                start = ts - (ts - offset_s) % every_s
+                while start > ts - period_s:
+                    starts.append(start)
+                    start -= every_s
+                for start in reversed(starts):
+                    if start not in open_windows:
+                        open_windows[start] = {name: (copy.deepcopy(func), None) for name, func in aggs}
+                    accumulators = open_windows[start]
+                    for name, (func, _) in accumulators.items():
+                        accumulators[name] = (func, func(ex))
+            for start, accumulators in open_windows.items():
+                yield close(start, accumulators)
+
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def progress(self, desc: str | None = None) -> LazyLines:
         """Adds a progress bar. Meant to be used early."""
-        stream_orig, stream_copy = it.tee(self.g)
-        total = sum(1 for _ in stream_copy)
+        budget = self._memory_budget()
+        if budget is None:
+            stream_orig, stream_copy = it.tee(self.g)
+            total = sum(1 for _ in stream_copy)
+        else:
+            stream_orig, nbytes = materialize(self.g, "progress", budget)
+            if nbytes:
+                budget.hold(stream_orig, nbytes)
+            total = len(stream_orig)
 
         def new_gen():
+            import tqdm
+
             yield from tqdm.tqdm(stream_orig, total=total, desc=desc)
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def collect(self) -> LazyLines:
         """
@@ -455,8 +842,83 @@ class LazyLines:
 
         Note that, as a consequence, this will also empty the lazyline object.
         """
+        import srsly
+
         srsly.write_jsonl(path, self.g, append=append, append_new_line=append_new_line)
 
+    def to_arrow_batches(self, batch_size: int = 10_000, schema=None):
+        """
+        Turns the items into a generator of `pyarrow.RecordBatch` objects.
+
+        Only `batch_size` items are kept in memory at a time. When no `schema` is
+        given, it is inferred from the first batch and used for all the other batches.
+        A `ValueError` is raised when a later batch doesn't fit that schema, for example
+        because it has a key that didn't appear before or because a key that only had
+        `None` values in the first batch gets a value, and also when no schema can be inferred
+        from the first batch. Pass a `schema` in those cases.
+        Requires `pyarrow`, which can be installed via `pip install lazylines[arrow]`.
+
+        Note that, as a consequence, this will also empty the lazyline object.
+
+        Arguments:
+            batch_size: the number of items per record batch
+            schema: optional `pyarrow.Schema` for the record batches
+        """
+        pa = _import_pyarrow()
+
+        def batch_gen():
+            batch_schema = schema
+            stream = iter(self.g)
+            for i in it.count():
+                chunk = list(it.islice(stream, batch_size))
+                if not chunk:
+                    return
+                if batch_schema is not None:
+                    unknown = {k for item in chunk for k in item} - set(batch_schema.names)
+                    if unknown:
+                        raise ValueError(
+                            f"Batch {i} has keys {sorted(unknown)} that are not in the schema, "
+                            "pass a `schema` that contains all the keys."
+                        )
+                try:
+                    batch = pa.RecordBatch.from_pylist(chunk, schema=batch_schema)
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    if batch_schema is None:
+                        raise ValueError(f"Can't infer a schema from batch {i}, pass a `schema`: {e}") from e
+                    raise ValueError(f"Batch {i} doesn't fit the schema {batch_schema.to_string()!r}: {e}") from e
+                batch_schema = batch.schema
+                yield batch
+
+        return batch_gen()
+
+    def write_parquet(self, path, row_group_size: int = 100_000, schema=None) -> None:
+        """
+        Write everything into a Parquet file, one row group at a time.
+
+        Only `row_group_size` items are kept in memory at a time. When no `schema` is
+        given, it is inferred from the first row group. Requires `pyarrow`, which can be
+        installed via `pip install lazylines[arrow]`.
+
+        Note that, as a consequence, this will also empty the lazyline object.
+
+        Arguments:
+            path: the path of the Parquet file
+            row_group_size: the number of items per row group
+            schema: optional `pyarrow.Schema` for the file
+        """
+        pa = _import_pyarrow()
+        writer = None
+        try:
+            for batch in self.to_arrow_batches(batch_size=row_group_size, schema=schema):
+                if writer is None:
+                    writer = pa.parquet.ParquetWriter(path, batch.schema)
+                writer.write_batch(batch, row_group_size=row_group_size)
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(path, schema if schema is not None else pa.schema([]))
+        finally:
+            if writer is not None:
+                writer.close()
+
     def select(self, *keys: str) -> LazyLines:
         """
         Only select specific keys from each dictionary.
@@ -492,7 +954,7 @@ class LazyLines:
             for ex in self.g:
                 yield {k: v for k, v in ex.items() if k in keys}
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def drop(self, *args) -> LazyLines:
         """
@@ -529,11 +991,11 @@ class LazyLines:
             for ex in self.g:
                 yield {k: v for k, v in ex.items() if k not in args}
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
     def pipe(self, func, *args, **kwargs) -> LazyLines:
         """Call a function over the entire generator."""
-        return LazyLines(g=func(self, *args, **kwargs))
+        return LazyLines(g=func(self, *args, **kwargs), budget=self.budget)
 
     def foreach(self, func, *args, **kwargs) -> LazyLines:
         """Just call a function on each dictionary, but pass the original forward."""
@@ -543,9 +1005,9 @@ class LazyLines:
                 func(ex, *args, **kwargs)
                 yield ex
 
-        return LazyLines(g=new_gen())
+        return LazyLines(g=new_gen(), budget=self.budget)
 
-    def agg(self, *args: Callable):
+    def agg(self, *args: Callable, checkpoint: Checkpoint | None = None, save: bool = True, n_jobs: int = 1):
         """
         Allows you to aggregate over all the items using special functions
         that will go over each item exactly once.
@@ -553,6 +1015,21 @@ class LazyLines:
         This function hopefully makes some things faster, but for something
         specialized it's best to just write a custom `.pipe()` function.
 
+        When a `Checkpoint` is passed, the state of the accumulators is restored
+        from it before the items are processed and saved to it afterwards. This
+        requires accumulators with `get_state()` and `set_state()` methods, like
+        the ones in `lazylines.functions`. With `save=False` the state is only
+        updated in memory, see `Checkpoint` for pipelines with several stages.
+
+        Without any items, accumulators with a `value()` method, like the ones in
+        `lazylines.functions`, report their empty value, which is `0` for `count()`
+        and `None` for `calc_mean()`.
+
+        With `n_jobs` larger than one, consecutive chunks of items are aggregated by a pool
+        of worker processes and the partial results are combined. This requires picklable
+        items and accumulators with a `merge()` method, like the ones in `lazylines.functions`.
+        `n_jobs` is capped at the number of available cores.
+
         ```python
         from lazylines import LazyLines
         from lazylines.functions import calc_mean, count
@@ -566,7 +1043,7 @@ class LazyLines:
         lines = LazyLines(examples)
 
         out = lines.agg(calc_mean('foo'), calc_mean('bar'), count())
-        expected = {'mean_foo': 3, 'mean_bar': 5, 'count': 3}
+        expected = {'mean_foo': 1, 'mean_bar': 5 / 3, 'count': 3}
         assert out == expected
         ```
         """
@@ -577,20 +1054,114 @@ class LazyLines:
             name, func = arg
             accumulators[name] = func
 
-        for ex in self.g:
-            for name, func in accumulators.items():
-                values[name] = func(ex)
+        partials = None
+        if n_jobs != 1:
+            from lazylines.parallel import n_workers, parallel_agg
 
+            n_jobs = n_workers(n_jobs)
+            if n_jobs > 1:
+                # This happens before the state is restored, so that the workers start out blank.
+                partials = parallel_agg(self.g, accumulators, n_jobs=n_jobs)
+
+        state_key = "agg:" + ",".join(accumulators)
+        saved = {} if checkpoint is None else checkpoint.state.get(state_key, {})
+        for name, func in accumulators.items():
+            if name in saved:
+                func.set_state(saved[name]["state"])
+                values[name] = saved[name]["value"]
+
+        if partials is None:
+            for ex in self.g:
+                for name, func in accumulators.items():
+                    values[name] = func(ex)
+        else:
+            for name, part in partials.items():
+                values[name] = accumulators[name].merge(part)
+        for name, func in accumulators.items():
+            # Without any items, accumulators with a `value()` method still report their empty value.
+            if name not in values and hasattr(func, "value"):
+                values[name] = func.value()
+
+        if checkpoint is not None:
+            checkpoint.state[state_key] = {
+                name: {"state": func.get_state(), "value": values.get(name)} for name, func in accumulators.items()
+            }
+            if save:
+                checkpoint.save()
         return values
 
-    def validate(self, pydantic_cls) -> LazyLines:
+    def agreement(self, task_key: str = "_task_hash", annotator_key: str = "_annotator_id", label_key: str = "answer"):
+        """
+        Calculates inter-annotator agreement in a single pass over the items.
+
+        The items need to be grouped by `task_key`, which means that all annotations
+        of a task need to be adjacent. Returns a dictionary with the agreement, Cohen's
+        kappa and the confusion matrix per pair of annotators as well as Fleiss' kappa and
+        Krippendorff's alpha over all tasks. If you need to combine results from different
+        partitions, have a look at `lazylines.functions.Agreement`.
+
+        Arguments:
+            task_key: the key that identifies the task
+            annotator_key: the key that identifies the annotator
+            label_key: the key that contains the label
+
+        ```python
+        from lazylines import LazyLines
+
+        data = [
+            {"_task_hash": 1, "_annotator_id": 1, "answer": "accept"},
+            {"_task_hash": 1, "_annotator_id": 2, "answer": "accept"},
+            {"_task_hash": 2, "_annotator_id": 1, "answer": "accept"},
+            {"_task_hash": 2, "_annotator_id": 2, "answer": "reject"},
+        ]
+
+        out = LazyLines(data).agreement()
+        pair = out["pairs"][0]
+        assert (pair["annot_a"], pair["annot_b"], pair["n_overlap"]) == (1, 2, 2)
+        assert pair["mean_agreement"] == 0.5
+        assert pair["confusion"] == {"accept": {"accept": 1, "reject": 1}}
+        ```
+        """
+        from lazylines.functions import Agreement
+
+        state = Agreement(task_key=task_key, annotator_key=annotator_key, label_key=label_key)
+        for ex in self.g:
+            state.update(ex)
+        return state.result()
+
+    def validate(
+        self,
+        pydantic_cls,
+        batch_size: int = 1000,
+        on_error: str = "raise",
+        errors: list | None = None,
+    ) -> LazyLines:
         """
         Validates each example with a Pydantic class. Then dumps the result back.
 
+        Examples are validated in batches of `batch_size` with a `pydantic.TypeAdapter`.
+        Pydantic models are dumped back in one go per batch. You can also pass a
+        `TypedDict`, in which case no model objects are constructed at all and the
+        validated dictionaries are passed on as-is.
+
+        A batch is validated by Pydantic in a single call. When it contains invalid examples,
+        the errors point out which ones, so that only those are handled one by one. The valid
+        examples of such a batch are validated once more, except with `on_error="skip"`, where
+        Pydantic drops the invalid examples itself. With `on_error="raise"`, the valid examples
+        that come before the first invalid one in a batch are still passed on before the error
+        of that example is raised.
+
+        Arguments:
+            pydantic_cls: the Pydantic model, or `TypedDict`, to validate against
+            batch_size: the number of examples to validate at once
+            on_error: what to do with invalid examples, either `"raise"`, `"skip"` or `"collect"`
+            errors: a list that receives `{"item": ..., "errors": [...]}` for each invalid example when `on_error="collect"`
+
         Usage:
 
         ```python
         from pydantic import BaseModel, PositiveInt
+        from typing_extensions import TypedDict
         from lazylines import LazyLines
 
         class Example(BaseModel):
@@ -602,7 +1173,64 @@ class LazyLines:
 
         assert collected[0] == {'id': 1, 'positive_int': 1}
         assert collected[1] == {'id': 2, 'positive_int': 2}
+
+        # Invalid examples can be collected instead of raising an error
+        errors = []
+        lines = LazyLines(({"id": i, "positive_int": str(i)} for i in range(-1, 3)))
+        collected = lines.validate(Example, on_error="collect", errors=errors).collect()
+
+        assert collected == [{'id': 1, 'positive_int': 1}, {'id': 2, 'positive_int': 2}]
+        assert [e["item"]["id"] for e in errors] == [-1, 0]
+        assert errors[0]["errors"][0]["loc"] == ("positive_int",)
+
+        # A TypedDict skips the model objects altogether
+        class ExampleDict(TypedDict):
+            id: int
+            positive_int: PositiveInt
+
+        lines = LazyLines(({"id": i, "positive_int": str(i)} for i in range(1, 10)))
+        assert lines.validate(ExampleDict).collect() == collected + [{'id': i, 'positive_int': i} for i in range(3, 10)]
         ```
         """
-        new_gen = (pydantic_cls(**ex).model_dump() for ex in self.g)
-        return LazyLines(g=new_gen)
+        from pydantic import BaseModel, OnErrorOmit, TypeAdapter, ValidationError
+
+        if on_error not in ("raise", "skip", "collect"):
+            raise ValueError(f"`on_error` must be 'raise', 'skip' or 'collect', got {on_error!r}.")
+        if on_error == "collect" and errors is None:
+            raise ValueError("Pass a list via `errors` to collect the invalid examples.")
+
+        adapter = TypeAdapter(List[pydantic_cls])
+        item_adapter = TypeAdapter(pydantic_cls)
+        omit_adapter = TypeAdapter(List[OnErrorOmit[pydantic_cls]]) if on_error == "skip" else None
+        is_model = isinstance(pydantic_cls, type) and issubclass(pydantic_cls, BaseModel)
+
+        def dump(valid):
+            return adapter.dump_python(valid) if is_model else valid
+
+        def new_gen():
+            stream = iter(self.g)
+            while True:
+                chunk = list(it.islice(stream, batch_size))
+                if not chunk:
+                    return
+                if omit_adapter is not None:
+                    yield from dump(omit_adapter.validate_python(chunk))
+                    continue
+                try:
+                    valid = adapter.validate_python(chunk)
+                except ValidationError as e:
+                    # The first part of the location is the index of the invalid example in the batch.
+                    invalid = {}
+                    for error in e.errors(include_url=False):
+                        invalid.setdefault(error["loc"][0], []).append({**error, "loc": error["loc"][1:]})
+                    if on_error == "raise":
+                        first = min(invalid)
+                        yield from dump(adapter.validate_python(chunk[:first]))
+                        # Validating the invalid example on its own raises the error of just that example.
+                        item_adapter.validate_python(chunk[first])
+                    for i in sorted(invalid):
+                        errors.append({"item": chunk[i], "errors": invalid[i]})
+                    valid = adapter.validate_python([ex for i, ex in enumerate(chunk) if i not in invalid])
+                yield from dump(valid)
+
+        return LazyLines(g=new_gen(), budget=self.budget)
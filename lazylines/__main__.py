@@ -0,0 +1,5 @@
+import sys
+
+from lazylines.cli import main
+
+sys.exit(main())
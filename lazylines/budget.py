@@ -0,0 +1,435 @@
+"""
+Keeps track of the memory that is retained by the verbs that materialize the stream.
+
+Verbs like `.cache()`, `.sort_by()`, `.nest_by()`, `.progress()` and `.tee()` need to hold
+on to (a part of) the stream. When a `MemoryBudget` is active, these verbs account for the
+approximate number of bytes they retain and the budget decides what happens when it runs out.
+"""
+
+from __future__ import annotations
+
+import collections
+import heapq
+import itertools as it
+import json
+import math
+import os
+import re
+import sys
+import threading
+import warnings
+import weakref
+
+POLICIES = ("raise", "warn", "spill")
+
+# The number of bytes that are reserved at once, see `_Reservation`.
+_RESERVE_BATCH = 64 * 1024
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
+
+
+class MemoryBudgetError(MemoryError):
+    """Raised when a stage needs more memory than the budget allows."""
+
+    def __init__(self, stage: str, requested: int, limit: int, reason: str = ""):
+        self.stage = stage
+        self.requested = requested
+        self.limit = limit
+        super().__init__(
+            f"Stage `{stage}` needs about {requested:,} bytes, which exceeds the memory budget of {limit:,} bytes.{reason}"
+        )
+
+
+def _parse_size(size: int | str) -> int:
+    if isinstance(size, int):
+        nbytes = size
+    else:
+        match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*", size.upper())
+        if match is None:
+            raise ValueError(f"Size must be a number of bytes or look like '512MB' or '2GB', got {size!r}.")
+        nbytes = int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+    if nbytes <= 0:
+        raise ValueError(f"Size must be positive, got {size!r}.")
+    return nbytes
+
+
+def approx_size(obj) -> int:
+    """Approximate the number of bytes retained by a (nested) item."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(approx_size(v) for v in obj)
+    return size
+
+
+class SizeEstimator:
+    """
+    Estimates the size of the items in a stream without walking every one of them.
+
+    The first `n_exact` items are measured with `approx_size()`, after that only every
+    `every`-th item is, the others get the running average of the measured items.
+    """
+
+    def __init__(self, n_exact: int = 100, every: int = 64):
+        self.n_exact = n_exact
+        self.every = every
+        self.seen = 0
+        self.measured = 0
+        self.total = 0
+
+    def __call__(self, item) -> int:
+        self.seen += 1
+        if self.seen <= self.n_exact or self.seen % self.every == 0:
+            size = approx_size(item)
+            self.measured += 1
+            self.total += size
+            return size
+        return self.total // self.measured
+
+
+class MemoryBudget:
+    """
+    A memory budget for the verbs that materialize the stream.
+
+    The budget can be shared between pipelines, also across threads, and keeps track of
+    the current and the peak number of retained bytes. When a stage would go over the
+    limit, the policy decides what happens:
+
+    - `"raise"` raises a `MemoryBudgetError` error that names the stage
+    - `"warn"` warns once per stage and carries on
+    - `"spill"` makes the stage write its items to a temporary .jsonl file, which requires items that can be
+      serialized to JSON. `.tee()` can't spill and raises instead.
+
+    Arguments:
+        limit: the number of bytes, or a string like `"512MB"` or `"2GB"`
+        policy: either `"raise"`, `"warn"` or `"spill"`
+        spill_dir: the folder for the temporary files, defaults to the system temporary folder
+
+    Usage:
+
+    ```python
+    from lazylines import LazyLines, MemoryBudget, set_memory_budget
+
+    # A budget for a single pipeline
+    budget = MemoryBudget("512MB", policy="spill")
+    items = LazyLines(({"a": i % 7} for i in range(1000))).with_budget(budget).sort_by("a").collect()
+    print(budget.current, budget.peak)
+
+    # A budget for all pipelines that don't have one of their own
+    set_memory_budget(MemoryBudget("2GB", policy="raise"))
+    ```
+    """
+
+    def __init__(self, limit: int | str, policy: str = "raise", spill_dir: str | None = None):
+        if policy not in POLICIES:
+            raise ValueError(f"`policy` must be one of {POLICIES}, got {policy!r}.")
+        self.limit = _parse_size(limit)
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self.current = 0
+        self.peak = 0
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"MemoryBudget(limit={self.limit}, policy={self.policy!r}, current={self.current}, peak={self.peak})"
+
+    def reserve(self, stage: str, nbytes: int, spillable: bool = True) -> bool:
+        """
+        Reserve memory for a stage. Returns `False` when the stage should spill to disk instead.
+
+        Arguments:
+            stage: the name of the stage, used in errors and warnings
+            nbytes: the number of bytes to reserve
+            spillable: whether the stage is able to spill to disk
+        """
+        with self._lock:
+            requested = self.current + nbytes
+            if requested > self.limit:
+                if self.policy == "spill" and spillable:
+                    return False
+                if self.policy != "warn":
+                    reason = "" if self.policy == "raise" else " This stage can't spill to disk."
+                    raise MemoryBudgetError(stage, requested, self.limit, reason)
+                if stage not in self._warned:
+                    self._warned.add(stage)
+                    warnings.warn(
+                        f"Stage `{stage}` retains about {requested:,} bytes, over the memory budget of {self.limit:,} bytes.",
+                        ResourceWarning,
+                        stacklevel=2,
+                    )
+            self.current = requested
+            self.peak = max(self.peak, self.current)
+        return True
+
+    def release(self, nbytes: int) -> None:
+        """Release memory that was reserved earlier."""
+        with self._lock:
+            self.current -= nbytes
+
+    def hold(self, container, nbytes: int):
+        """Keep `nbytes` reserved for as long as `container` is alive."""
+        weakref.finalize(container, self.release, nbytes)
+        return container
+
+
+_global_budget = None
+
+
+def set_memory_budget(budget: MemoryBudget | None) -> None:
+    """Set the memory budget for all pipelines without a budget of their own, `None` removes it."""
+    global _global_budget
+    _global_budget = budget
+
+
+def get_memory_budget() -> MemoryBudget | None:
+    """Return the memory budget that is used by pipelines without a budget of their own."""
+    return _global_budget
+
+
+class TrackedList(list):
+    """A list that can be weakly referenced, so that its reserved memory is released when it is freed."""
+
+    __slots__ = ("__weakref__",)
+
+
+class SpilledItems:
+    """Items that are stored in a temporary .jsonl file, which is removed when this object is freed."""
+
+    def __init__(self, items, spill_dir: str | None = None):
+        import tempfile
+
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl", prefix="lazylines-", dir=spill_dir)
+        self._finalizer = weakref.finalize(self, os.remove, self.path)
+        self.nbytes = 0
+        self.n = 0
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for item in items:
+                line = json.dumps(item) + "\n"
+                self.nbytes += len(line)
+                self.n += 1
+                f.write(line)
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+class _Reservation:
+    """
+    Reserves the estimated size of items for a stage in batches, so the budget isn't locked for every item.
+
+    Items are at most one batch ahead of the budget, a batch is small compared to the limit.
+    """
+
+    def __init__(self, budget: MemoryBudget, stage: str, spillable: bool = True):
+        self.budget = budget
+        self.stage = stage
+        self.spillable = spillable
+        self.sizes = SizeEstimator()
+        self.batch = max(1, min(_RESERVE_BATCH, budget.limit // 64))
+        self.pending = 0
+        self.reserved = 0
+
+    def add(self, item) -> bool:
+        """Account for an item, returns `False` when the budget asks to spill."""
+        self.pending += self.sizes(item)
+        return self.pending < self.batch or self.flush()
+
+    def flush(self) -> bool:
+        """Reserve the pending bytes, returns `False` when the budget asks to spill."""
+        if self.pending and not self.budget.reserve(self.stage, self.pending, self.spillable):
+            return False
+        self.reserved += self.pending
+        self.pending = 0
+        return True
+
+    def release(self) -> None:
+        """Release everything that was reserved and forget about the pending bytes."""
+        self.budget.release(self.reserved)
+        self.reserved = 0
+        self.pending = 0
+
+
+def materialize(items, stage: str, budget: MemoryBudget | None):
+    """
+    Turns the items into a list while accounting for them in the budget.
+
+    Returns a tuple with the items and the number of bytes that are reserved for them.
+    When the budget asks to spill, the items are returned as `SpilledItems` instead.
+    """
+    if budget is None:
+        return list(items), 0
+    buffer = TrackedList()
+    reservation = _Reservation(budget, stage)
+    stream = iter(items)
+    try:
+        for item in stream:
+            buffer.append(item)
+            if not reservation.add(item):
+                break
+        else:
+            if reservation.flush():
+                return buffer, reservation.reserved
+    except BaseException:
+        reservation.release()
+        raise
+    reservation.release()
+    return SpilledItems(it.chain(buffer, stream), budget.spill_dir), 0
+
+
+def _budgeted_chunks(items, stage: str, budget: MemoryBudget):
+    """
+    Yield chunks of items that fit in what is left of the budget.
+
+    The memory of a chunk stays reserved until the next chunk is requested.
+    """
+    reservation = _Reservation(budget, stage)
+    chunk = []
+    try:
+        for item in items:
+            chunk.append(item)
+            if not reservation.add(item):
+                if len(chunk) == 1:
+                    requested = budget.current + reservation.pending
+                    raise MemoryBudgetError(stage, requested, budget.limit, " Not even a single item fits.")
+                yield chunk
+                reservation.release()
+                chunk = []
+        if chunk:
+            reservation.flush()
+            yield chunk
+    finally:
+        reservation.release()
+
+
+def external_sort(items: SpilledItems, key, budget: MemoryBudget):
+    """Sort spilled items by sorting chunks that fit in the budget and merging the sorted runs."""
+    runs = []
+    for chunk in _budgeted_chunks(items, "sort_by", budget):
+        chunk.sort(key=key)
+        runs.append(SpilledItems(chunk, budget.spill_dir))
+    yield from heapq.merge(*runs, key=key)
+
+
+def external_group(items: SpilledItems, group_key, budget: MemoryBudget):
+    """
+    Group spilled items by first partitioning them over temporary files by the hash of their key.
+
+    Yields `(key, items)` pairs, partition by partition. Each partition is accounted for in the
+    budget while it is grouped and a `MemoryBudgetError` is raised when one doesn't fit.
+    """
+    import tempfile
+
+    # The JSON on disk is a lot more compact than the items in memory, a sample gives the ratio.
+    stream = iter(items)
+    sample = list(it.islice(stream, 1000))
+    ratio = sum(map(approx_size, sample)) / max(sum(len(json.dumps(item)) + 1 for item in sample), 1)
+    available = max(budget.limit - budget.current, 1)
+    n_partitions = min(256, max(2, math.ceil(2 * items.nbytes * ratio / available)))
+    paths, files = [], []
+    reservation = _Reservation(budget, "nest_by")
+    try:
+        for _ in range(n_partitions):
+            fd, path = tempfile.mkstemp(suffix=".jsonl", prefix="lazylines-", dir=budget.spill_dir)
+            paths.append(path)
+            files.append(os.fdopen(fd, "w", encoding="utf-8"))
+        for item in it.chain(sample, stream):
+            files[hash(group_key(item)) % n_partitions].write(json.dumps(item) + "\n")
+        for f in files:
+            f.close()
+        for path in paths:
+            groups = {}
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    item = json.loads(line)
+                    groups.setdefault(group_key(item), []).append(item)
+                    if not reservation.add(item):
+                        break
+            if not reservation.flush():
+                raise MemoryBudgetError(
+                    "nest_by",
+                    budget.current + reservation.pending,
+                    budget.limit,
+                    f" The spilled items were split into {n_partitions} partitions, but one of them doesn't fit.",
+                )
+            yield from groups.items()
+            reservation.release()
+    finally:
+        reservation.release()
+        for f in files:
+            f.close()
+        for path in paths:
+            os.remove(path)
+
+
+def budgeted_tee(items, n: int, stage: str, budget: MemoryBudget):
+    """
+    Like `itertools.tee`, but items that are buffered for the other copies are accounted for in the budget.
+
+    The buffer of a copy is released once that copy is exhausted or freed, also when it was never started.
+    """
+    source = iter(items)
+    buffers = [collections.deque() for _ in range(n)]
+    live = list(buffers)
+    sizes = SizeEstimator()
+    batch = max(1, min(_RESERVE_BATCH, budget.limit // 64))
+    # Bytes that still have to be reserved, or released when negative, which happens in batches.
+    delta = 0
+
+    def adjust(nbytes, force=False):
+        nonlocal delta
+        delta += nbytes
+        if delta >= batch or (force and delta > 0):
+            nbytes, delta = delta, 0
+            budget.reserve(stage, nbytes, spillable=False)
+        elif delta <= -batch or (force and delta < 0):
+            nbytes, delta = delta, 0
+            budget.release(-nbytes)
+
+    def consume(entry):
+        entry[2] -= 1
+        if entry[2] == 0:
+            adjust(-entry[1])
+
+    def retire(buffer):
+        for i, other in enumerate(live):
+            if other is buffer:
+                del live[i]
+                break
+        while buffer:
+            consume(buffer.popleft())
+        adjust(0, force=True)
+
+    def copy_gen(mine):
+        try:
+            while True:
+                if mine:
+                    entry = mine.popleft()
+                    consume(entry)
+                    yield entry[0]
+                    continue
+                try:
+                    item = next(source)
+                except StopIteration:
+                    return
+                others = [buffer for buffer in live if buffer is not mine]
+                if others:
+                    # Entries hold the item, its size and the number of copies that still need it.
+                    entry = [item, sizes(item), len(others)]
+                    adjust(entry[1])
+                    for buffer in others:
+                        buffer.append(entry)
+                yield item
+        finally:
+            retire(mine)
+
+    copies = tuple(copy_gen(buffer) for buffer in buffers)
+    for copy, buffer in zip(copies, buffers):
+        weakref.finalize(copy, retire, buffer)
+    return copies
@@ -0,0 +1,122 @@
+"""
+The `lazylines` command line tool, which streams JSONL from stdin to stdout.
+
+```
+cat annotations.jsonl | lazylines keep 'd["answer"] == "accept"' select text label head 100
+cat annotations.jsonl | lazylines nest_by label
+cat annotations.jsonl | lazylines agg count mean:score
+```
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+
+from lazylines import LazyLines
+
+BUFFER_SIZE = 1 << 20
+
+USAGE = """usage: lazylines VERB [ARG ...] [VERB [ARG ...] ...]
+
+Reads JSONL from stdin, applies the verbs in order and writes JSONL to stdout.
+
+verbs:
+  keep EXPR ...        keep items for which all python expressions are true, the item is called `d`
+  select KEY ...       only keep these keys
+  drop KEY ...         drop these keys
+  rename NEW=OLD ...   rename keys
+  head [N]             only keep the first N items, defaults to 5
+  sort_by KEY ...      sort the items by these keys
+  nest_by KEY ...      group the items by these keys
+  agg SPEC ...         aggregate into a single item, SPEC is `count`, `count:KEY` or `mean:KEY`
+"""
+
+VERBS = ("keep", "select", "drop", "rename", "head", "sort_by", "nest_by", "agg")
+
+
+class UsageError(Exception):
+    """Raised when the command line arguments don't describe a valid pipeline."""
+
+
+def parse_pipeline(args: list[str]) -> list[tuple[str, list[str]]]:
+    """Split the arguments into `(verb, arguments)` pairs, verb names can't be used as arguments."""
+    pipeline = []
+    for arg in args:
+        if arg in VERBS:
+            pipeline.append((arg, []))
+        elif not pipeline:
+            raise UsageError(f"Expected a verb, got {arg!r}.")
+        else:
+            pipeline[-1][1].append(arg)
+    if any(verb == "agg" for verb, _ in pipeline[:-1]):
+        raise UsageError("`agg` has to be the last verb.")
+    return pipeline
+
+
+def _agg_spec(spec: str):
+    from lazylines.functions import calc_mean, count
+
+    name, _, key = spec.partition(":")
+    if name == "count":
+        return count(key or None)
+    if name == "mean" and key:
+        return calc_mean(key)
+    raise UsageError(f"Unknown aggregation {spec!r}, use `count`, `count:KEY` or `mean:KEY`.")
+
+
+def apply_verb(lines: LazyLines, verb: str, args: list[str]):
+    """Apply a single verb from the command line to a LazyLines object."""
+    if verb == "keep":
+        funcs = []
+        for expr in args:
+            try:
+                funcs.append(eval(f"lambda d: ({expr})"))  # nosec
+            except SyntaxError as e:
+                raise UsageError(f"Invalid `keep` expression {expr!r}: {e.msg}.") from e
+        return lines.keep(*funcs)
+    if verb in ("select", "drop", "sort_by", "nest_by"):
+        if not args:
+            raise UsageError(f"`{verb}` needs at least one key.")
+        return getattr(lines, verb)(*args)
+    if verb == "rename":
+        pairs = [arg.split("=", 1) for arg in args]
+        if any(len(pair) != 2 for pair in pairs):
+            raise UsageError("`rename` expects arguments like NEW=OLD.")
+        return lines.rename(**dict(pairs))
+    if verb == "head":
+        if len(args) > 1 or (args and not args[0].isdigit()):
+            raise UsageError("`head` expects a single number.")
+        return lines.head(int(args[0]) if args else 5)
+    return lines.agg(*[_agg_spec(spec) for spec in args])
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run a pipeline of verbs over JSONL on stdin and write JSONL to stdout."""
+    args = sys.argv[1:] if argv is None else argv
+    if not args or args[0] in ("-h", "--help"):
+        sys.stdout.write(USAGE)
+        return 0
+
+    try:
+        with open(sys.stdin.fileno(), "rb", buffering=BUFFER_SIZE, closefd=False) as stdin, open(
+            sys.stdout.fileno(), "wb", buffering=BUFFER_SIZE, closefd=False
+        ) as stdout:
+            result = LazyLines(json.loads(line) for line in stdin if line.strip())
+            for verb, verb_args in parse_pipeline(args):
+                result = apply_verb(result, verb, verb_args)
+            items = [result] if isinstance(result, dict) else result
+            for item in items:
+                stdout.write(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+                stdout.write(b"\n")
+    except UsageError as e:
+        sys.stderr.write(f"lazylines: {e}\n\n{USAGE}")
+        return 2
+    except BrokenPipeError:
+        # The reader went away, like `head` does, so there is nobody left to write to.
+        return 0
+    except Exception as e:
+        # Errors in the data, like a missing key or invalid JSON, are reported without a traceback.
+        sys.stderr.write(f"lazylines: {type(e).__name__}: {e}\n")
+        return 1
+    return 0
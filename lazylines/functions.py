@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import datetime as dt
 import itertools as it
 
@@ -34,7 +36,21 @@ class _MeanAccumulator:
     def __call__(self, ex):
         self.accum += ex[self.name]
         self.n += 1
-        return self.accum
+        return self.accum / self.n
+
+    def get_state(self):
+        return {"accum": self.accum, "n": self.n}
+
+    def set_state(self, state):
+        self.accum, self.n = state["accum"], state["n"]
+
+    def merge(self, other):
+        self.accum += other.accum
+        self.n += other.n
+        return self.accum / self.n
+
+    def value(self):
+        return self.accum / self.n if self.n else None
 
 
 class _CountAccumulator:
@@ -49,6 +65,19 @@ class _CountAccumulator:
             self.accum += 1 if self.name in ex else 0
         return self.accum
 
+    def get_state(self):
+        return {"accum": self.accum}
+
+    def set_state(self, state):
+        self.accum = state["accum"]
+
+    def merge(self, other):
+        self.accum += other.accum
+        return self.accum
+
+    def value(self):
+        return self.accum
+
 
 def calc_mean(col: str):
     """Can be used to calculate the mean of a key in a LazyLines collection"""
@@ -75,3 +104,179 @@ def calc_agreement(lines: LazyLines, label: str):
         .drop("subset")
         .show(2)
     )
+
+
+def _annotator_key(annotator):
+    # One order for all tasks, so that a pair of annotators always gets the same key.
+    if isinstance(annotator, (int, float, str, bytes)):
+        return type(annotator).__name__, annotator
+    return type(annotator).__name__, repr(annotator)
+
+
+def _sorted_annotators(labels: dict):
+    return sorted(labels, key=_annotator_key)
+
+
+class Agreement:
+    """
+    Mergeable state that calculates inter-annotator agreement in a single pass.
+
+    Rows are expected to be grouped by task, which means that all the rows of a task
+    need to be adjacent. Only the labels of the current task are kept around, all other
+    statistics are stored as counters. That means that no pair rows are built and that
+    states from different partitions can be combined via `.merge()`, also after pickling
+    them, as long as a task doesn't appear in more than one partition.
+
+    To detect tasks that aren't adjacent, the ids of all the tasks that have been seen
+    are kept in memory as well. Set `check_grouped=False` to skip this check when you
+    know the rows are grouped and memory matters.
+
+    Arguments:
+        task_key: the key that identifies the task
+        annotator_key: the key that identifies the annotator
+        label_key: the key that contains the label
+        check_grouped: keep track of the task ids to raise an error when a task isn't adjacent
+    """
+
+    def __init__(
+        self,
+        task_key: str = "_task_hash",
+        annotator_key: str = "_annotator_id",
+        label_key: str = "answer",
+        check_grouped: bool = True,
+    ):
+        self.task_key = task_key
+        self.annotator_key = annotator_key
+        self.label_key = label_key
+        self.confusion = {}
+        self.label_totals = {}
+        self.n_tasks = 0
+        self.n_pairable = 0
+        self.observed_agreement = 0.0
+        self.disagreement = 0.0
+        self.check_grouped = check_grouped
+        self.seen = set()
+        # A flag instead of a sentinel object, so that the state survives pickling.
+        self._has_task = False
+        self._task = None
+        self._labels = {}
+
+    def update(self, ex: dict) -> Agreement:
+        """Add a single row to the state."""
+        task = ex[self.task_key]
+        if not self._has_task or task != self._task:
+            self._flush()
+            if task in self.seen:
+                raise ValueError(
+                    f"Task {task!r} appeared again after other tasks. Rows need to be grouped by `{self.task_key}`, "
+                    f"you may want to call `.sort_by('{self.task_key}')` first."
+                )
+            if self.check_grouped:
+                self.seen.add(task)
+            self._has_task, self._task = True, task
+        self._labels[ex[self.annotator_key]] = ex[self.label_key]
+        return self
+
+    def _flush(self):
+        if not self._has_task:
+            return
+        labels = self._labels
+        self._has_task, self._task, self._labels = False, None, {}
+        self.n_tasks += 1
+        m = len(labels)
+        if m < 2:
+            return
+        annotators = _sorted_annotators(labels)
+        for i, annot_a in enumerate(annotators):
+            for annot_b in annotators[i + 1 :]:
+                cell = (labels[annot_a], labels[annot_b])
+                matrix = self.confusion.setdefault((annot_a, annot_b), {})
+                matrix[cell] = matrix.get(cell, 0) + 1
+        counts = {}
+        for label in labels.values():
+            counts[label] = counts.get(label, 0) + 1
+        same = sum(n * (n - 1) for n in counts.values())
+        for label, n in counts.items():
+            self.label_totals[label] = self.label_totals.get(label, 0) + n
+        self.n_pairable += 1
+        self.observed_agreement += same / (m * (m - 1))
+        self.disagreement += (m * (m - 1) - same) / (m - 1)
+
+    def merge(self, other: Agreement) -> Agreement:
+        """Merge the state of another `Agreement` object, calculated on another partition, into this one."""
+        self._flush()
+        other._flush()
+        overlap = self.seen & other.seen
+        if overlap:
+            raise ValueError(f"Cannot merge states that share tasks, found {len(overlap)} shared task(s).")
+        for pair, matrix in other.confusion.items():
+            target = self.confusion.setdefault(pair, {})
+            for cell, n in matrix.items():
+                target[cell] = target.get(cell, 0) + n
+        for label, n in other.label_totals.items():
+            self.label_totals[label] = self.label_totals.get(label, 0) + n
+        self.seen |= other.seen
+        self.n_tasks += other.n_tasks
+        self.n_pairable += other.n_pairable
+        self.observed_agreement += other.observed_agreement
+        self.disagreement += other.disagreement
+        return self
+
+    @staticmethod
+    def _cohen_kappa(matrix: dict):
+        n = sum(matrix.values())
+        rows, cols = {}, {}
+        agree = 0
+        for (label_a, label_b), count in matrix.items():
+            rows[label_a] = rows.get(label_a, 0) + count
+            cols[label_b] = cols.get(label_b, 0) + count
+            if label_a == label_b:
+                agree += count
+        p_o = agree / n
+        p_e = sum(rows[k] * cols.get(k, 0) for k in rows) / n**2
+        kappa = None if p_e == 1 else (p_o - p_e) / (1 - p_e)
+        return agree, kappa
+
+    def fleiss_kappa(self):
+        """Fleiss' kappa over all tasks with at least two annotations, `None` if undefined."""
+        n = sum(self.label_totals.values())
+        if self.n_pairable == 0:
+            return None
+        p_bar = self.observed_agreement / self.n_pairable
+        p_e = sum((c / n) ** 2 for c in self.label_totals.values())
+        return None if p_e == 1 else (p_bar - p_e) / (1 - p_e)
+
+    def krippendorff_alpha(self):
+        """Krippendorff's alpha for nominal data, `None` if undefined."""
+        n = sum(self.label_totals.values())
+        expected = n**2 - sum(c**2 for c in self.label_totals.values())
+        if expected == 0:
+            return None
+        return 1 - (n - 1) * self.disagreement / expected
+
+    def result(self) -> dict:
+        """Return the agreement statistics, both per pair of annotators as well as overall."""
+        self._flush()
+        pairs = []
+        for (annot_a, annot_b), matrix in self.confusion.items():
+            agree, kappa = self._cohen_kappa(matrix)
+            n_overlap = sum(matrix.values())
+            confusion = {}
+            for (label_a, label_b), count in matrix.items():
+                confusion.setdefault(label_a, {})[label_b] = count
+            pairs.append(
+                {
+                    "annot_a": annot_a,
+                    "annot_b": annot_b,
+                    "n_overlap": n_overlap,
+                    "mean_agreement": agree / n_overlap,
+                    "cohen_kappa": kappa,
+                    "confusion": confusion,
+                }
+            )
+        return {
+            "n_tasks": self.n_tasks,
+            "pairs": pairs,
+            "fleiss_kappa": self.fleiss_kappa(),
+            "krippendorff_alpha": self.krippendorff_alpha(),
+        }
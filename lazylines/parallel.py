@@ -0,0 +1,79 @@
+"""
+Runs `.agg()` over a pool of worker processes, used via `.agg(..., n_jobs=...)`.
+
+The stream is cut into consecutive chunks of raw items that are sent to the workers as-is.
+Every worker aggregates its chunks with fresh copies of the accumulators and only these
+small partial accumulators are sent back, which are merged afterwards. Every worker gets
+chunks of the same size, so skewed data doesn't leave workers idle.
+"""
+
+from __future__ import annotations
+
+import collections
+import itertools as it
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+
+def n_workers(n_jobs: int) -> int:
+    """Return the number of worker processes for `n_jobs`, which is capped at the number of available cores."""
+    if n_jobs != -1 and n_jobs < 1:
+        raise ValueError(f"`n_jobs` must be a positive number or -1, got {n_jobs}.")
+    cores = _available_cores()
+    return cores if n_jobs == -1 else min(n_jobs, cores)
+
+
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _agg_chunk(accumulators: bytes, chunk: list) -> dict:
+    """Run fresh copies of the pickled accumulators over a chunk of items, this runs in a worker process."""
+    accumulators = pickle.loads(accumulators)
+    for item in chunk:
+        for func in accumulators.values():
+            func(item)
+    return accumulators
+
+
+def _map_chunks(func, arg, items, n_jobs: int, chunk_size: int):
+    """Yield `func(arg, chunk)` for consecutive chunks of the items, in order."""
+    stream = iter(items)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = collections.deque()
+        for chunk in iter(lambda: list(it.islice(stream, chunk_size)), []):
+            pending.append(executor.submit(func, arg, chunk))
+            # Keep a bounded number of chunks in flight, so the stream isn't read faster than it's processed.
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def parallel_agg(items, accumulators: dict, n_jobs: int = -1, chunk_size: int = 10_000) -> dict:
+    """
+    Run the accumulators over `n_jobs` worker processes and return them merged.
+
+    Every worker starts from a copy of the accumulators as they are passed in, the
+    partial accumulators are combined via their `.merge()` method. Returns an empty
+    dictionary when there are no items.
+
+    Arguments:
+        items: the items to aggregate, they need to be picklable
+        accumulators: a dictionary of picklable accumulators by name
+        n_jobs: the number of worker processes, -1 uses all cores
+        chunk_size: the number of items that are sent to a worker at once
+    """
+    template = pickle.dumps(accumulators)
+    merged = {}
+    for partial in _map_chunks(_agg_chunk, template, items, n_workers(n_jobs), chunk_size):
+        if not merged:
+            merged = partial
+            continue
+        for name, func in merged.items():
+            func.merge(partial[name])
+    return merged
@@ -0,0 +1,132 @@
+import gc
+
+import pytest
+
+from lazylines import LazyLines, MemoryBudget, MemoryBudgetError, get_memory_budget, set_memory_budget
+from lazylines.budget import SizeEstimator, approx_size
+
+
+@pytest.fixture
+def data():
+    return [{"a": i % 7, "b": i} for i in range(500)]
+
+
+def test_raise_names_stage(data):
+    budget = MemoryBudget(1000, policy="raise")
+    with pytest.raises(MemoryBudgetError, match="nest_by"):
+        LazyLines(iter(data)).with_budget(budget).nest_by("a")
+    assert budget.current == 0
+    assert 0 < budget.peak <= 1000
+
+
+def test_warn(data):
+    budget = MemoryBudget("1KB", policy="warn")
+    with pytest.warns(ResourceWarning, match="sort_by"):
+        result = LazyLines(iter(data)).with_budget(budget).sort_by("a").collect()
+    assert result == sorted(data, key=lambda d: d["a"])
+
+
+def test_spill(data, tmp_path):
+    budget = MemoryBudget("2KB", policy="spill", spill_dir=str(tmp_path))
+    lines = LazyLines(iter(data)).with_budget(budget)
+    assert lines.sort_by("a", "b").collect() == sorted(data, key=lambda d: (d["a"], d["b"]))
+
+    cached = LazyLines(iter(data)).with_budget(budget).cache()
+    assert cached.collect() == data
+    assert cached.collect() == data
+    del cached
+    gc.collect()
+    assert list(tmp_path.iterdir()) == []
+    assert budget.current == 0
+
+
+def test_spill_nest_by(data, tmp_path):
+    # A single group fits in the budget, all of them don't.
+    budget = MemoryBudget("100KB", policy="spill", spill_dir=str(tmp_path))
+    expected = LazyLines([dict(d) for d in data]).nest_by("a").collect()
+    result = LazyLines([dict(d) for d in data]).with_budget(budget).nest_by("a").collect()
+    assert sorted(result, key=lambda d: d["a"]) == expected
+    assert budget.peak <= budget.limit
+    assert budget.current == 0
+    assert list(tmp_path.iterdir()) == []
+
+    budget = MemoryBudget("2KB", policy="spill", spill_dir=str(tmp_path))
+    with pytest.raises(MemoryBudgetError, match="partitions"):
+        LazyLines([dict(d) for d in data]).with_budget(budget).nest_by("a").collect()
+    gc.collect()
+    assert budget.current == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_sort_stays_within_budget(data, tmp_path):
+    budget = MemoryBudget("4KB", policy="spill", spill_dir=str(tmp_path))
+    result = LazyLines(iter(data)).with_budget(budget).sort_by("b").collect()
+    assert [d["b"] for d in result] == list(range(500))
+    assert budget.peak <= budget.limit
+    assert budget.current == 0
+
+
+def test_retained_memory_is_released(data):
+    budget = MemoryBudget("10MB")
+    set_memory_budget(budget)
+    try:
+        cached = LazyLines(iter(data)).cache()
+        assert get_memory_budget() is budget
+        assert budget.current > 0
+        del cached
+        gc.collect()
+        assert budget.current == 0
+
+        lines1, lines2 = LazyLines(iter(data)).tee()
+        assert len(lines1.collect()) == 500
+        assert budget.current > 0
+        assert len(lines2.collect()) == 500
+        assert budget.current == 0
+    finally:
+        set_memory_budget(None)
+
+
+def test_tee_cannot_spill(data):
+    lines1, _ = LazyLines(iter(data)).with_budget(MemoryBudget(1000, policy="spill")).tee()
+    with pytest.raises(MemoryBudgetError, match="tee"):
+        lines1.collect()
+
+
+def test_tee_releases_unstarted_copy(data):
+    budget = MemoryBudget("10MB")
+    lines1, lines2 = LazyLines(iter(data)).with_budget(budget).tee()
+    assert len(lines1.collect()) == 500
+    assert budget.current > 0
+    del lines1, lines2
+    gc.collect()
+    assert budget.current == 0
+
+    # Once a copy is gone, the other copies no longer buffer items for it.
+    lines1, lines2 = LazyLines(iter(data)).with_budget(budget).tee()
+    del lines2
+    gc.collect()
+    assert len(lines1.collect()) == 500
+    assert budget.peak > 0
+    assert budget.current == 0
+
+
+def test_sizes_are_sampled_and_reserved_in_batches(data):
+    estimate = SizeEstimator(n_exact=10, every=50)
+    total = sum(estimate(d) for d in data)
+    assert estimate.measured == 10 + 500 // 50
+    assert abs(total - sum(approx_size(d) for d in data)) < 0.05 * total
+
+    class CountingBudget(MemoryBudget):
+        calls = 0
+
+        def reserve(self, stage, nbytes, spillable=True):
+            self.calls += 1
+            return super().reserve(stage, nbytes, spillable)
+
+    budget = CountingBudget("10MB")
+    cached = LazyLines(iter(data)).with_budget(budget).cache()
+    assert 0 < budget.calls < 10
+    assert budget.current > 0
+    del cached
+    gc.collect()
+    assert budget.current == 0
@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from lazylines.cli import UsageError, parse_pipeline
+
+
+def run_cli(*args, stdin=""):
+    """Runs the command line tool in a fresh process."""
+    return subprocess.run([sys.executable, "-m", "lazylines", *args], input=stdin.encode(), capture_output=True, check=False)
+
+
+def test_parse_pipeline():
+    assert parse_pipeline(["keep", "d['a'] > 1", "select", "a", "b", "head"]) == [
+        ("keep", ["d['a'] > 1"]),
+        ("select", ["a", "b"]),
+        ("head", []),
+    ]
+    with pytest.raises(UsageError):
+        parse_pipeline(["a", "select"])
+    with pytest.raises(UsageError):
+        parse_pipeline(["agg", "count", "head"])
+
+
+def test_cli_pipeline():
+    stdin = "".join(json.dumps({"a": i, "b": i % 3}) + "\n" for i in range(10))
+    out = run_cli("keep", "d['a'] > 2", "drop", "b", "sort_by", "a", "head", "2", stdin=stdin)
+    assert out.returncode == 0
+    assert out.stdout.decode().splitlines() == ['{"a": 3}', '{"a": 4}']
+
+    out = run_cli("agg", "count", "mean:b", stdin=stdin)
+    assert json.loads(out.stdout) == {"count": 10, "mean_b": 0.9}
+
+    out = run_cli("rename", "a", stdin=stdin)
+    assert out.returncode == 2
+
+
+def test_cli_errors():
+    stdin = "".join(json.dumps({"a": i}) + "\n" for i in range(3))
+    out = run_cli("sort_by", "missing", stdin=stdin)
+    assert out.returncode == 1
+    assert out.stderr.decode() == "lazylines: KeyError: 'missing'\n"
+
+    out = run_cli("keep", "d['a'] >", stdin=stdin)
+    assert out.returncode == 2
+    assert out.stderr.decode().startswith("lazylines: Invalid `keep` expression")
+
+    out = run_cli("agg", "count", "mean:a", stdin="")
+    assert json.loads(out.stdout) == {"count": 0, "mean_a": None}
+
+
+def test_import_is_lightweight():
+    code = "import sys, lazylines; print(sorted({'srsly', 'tqdm', 'urllib.request', 'pydantic'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, check=True)
+    assert out.stdout.decode().strip() == "[]"
@@ -1,7 +1,80 @@
-from lazylines.functions import round_timestamp
+import pickle
+
+import pytest
+
+from lazylines import LazyLines
+from lazylines.functions import Agreement, round_timestamp
 
 
 def test_round_timestamp():
     assert round_timestamp(1545730073, to="day") == "2018-12-25"
     assert round_timestamp(1545730073, to="week") == "2018-52"
     assert round_timestamp(1545730073, to="month") == "2018-12"
+
+
+@pytest.fixture
+def annotations():
+    return [
+        {"_task_hash": 1, "_annotator_id": 1, "answer": "accept"},
+        {"_task_hash": 1, "_annotator_id": 2, "answer": "accept"},
+        {"_task_hash": 1, "_annotator_id": 3, "answer": "reject"},
+        {"_task_hash": 1, "_annotator_id": 4, "answer": "reject"},
+        {"_task_hash": 2, "_annotator_id": 1, "answer": "accept"},
+        {"_task_hash": 2, "_annotator_id": 2, "answer": "accept"},
+        {"_task_hash": 2, "_annotator_id": 3, "answer": "accept"},
+        {"_task_hash": 3, "_annotator_id": 2, "answer": "accept"},
+    ]
+
+
+def test_agreement(annotations):
+    out = LazyLines(annotations).agreement()
+    assert out["n_tasks"] == 3
+    assert len(out["pairs"]) == 6
+    assert out["fleiss_kappa"] == pytest.approx(11 / 60)
+    assert out["krippendorff_alpha"] == pytest.approx(0.2)
+    pairs = {(p["annot_a"], p["annot_b"]): p for p in out["pairs"]}
+    assert pairs[1, 3]["n_overlap"] == 2
+    assert pairs[1, 3]["mean_agreement"] == 0.5
+    assert pairs[1, 3]["confusion"] == {"accept": {"reject": 1, "accept": 1}}
+
+
+def test_agreement_merge(annotations):
+    left, right = Agreement(), Agreement()
+    for ex in annotations[:4]:
+        left.update(ex)
+    for ex in annotations[4:]:
+        right.update(ex)
+    assert left.merge(right).result() == LazyLines(annotations).agreement()
+
+    with pytest.raises(ValueError):
+        Agreement().merge(Agreement().update(annotations[0])).merge(Agreement().update(annotations[1]))
+
+
+def test_agreement_requires_grouped_tasks(annotations):
+    with pytest.raises(ValueError):
+        LazyLines(annotations + annotations[:1]).agreement()
+
+
+def test_agreement_merge_pickled(annotations):
+    """States are usually pickled when they are sent back from another process."""
+    left, right = Agreement(), Agreement(check_grouped=False)
+    for ex in annotations[:4]:
+        left.update(ex)
+    for ex in annotations[4:]:
+        right.update(ex)
+    merged = pickle.loads(pickle.dumps(left)).merge(pickle.loads(pickle.dumps(right)))
+    assert merged.result() == LazyLines(annotations).agreement()
+    assert merged.result()["n_tasks"] == 3
+
+
+def test_agreement_mixed_annotator_types():
+    """A pair of annotators gets the same key in every task, also when other tasks have annotators of another type."""
+    rows = [
+        {"_task_hash": 1, "_annotator_id": 9, "answer": "accept"},
+        {"_task_hash": 1, "_annotator_id": 10, "answer": "accept"},
+        {"_task_hash": 2, "_annotator_id": 9, "answer": "accept"},
+        {"_task_hash": 2, "_annotator_id": 10, "answer": "reject"},
+        {"_task_hash": 2, "_annotator_id": "x", "answer": "accept"},
+    ]
+    pairs = {(p["annot_a"], p["annot_b"]): p["n_overlap"] for p in LazyLines(rows).agreement()["pairs"]}
+    assert pairs == {(9, 10): 2, (9, "x"): 1, (10, "x"): 1}
@@ -1,6 +1,9 @@
 from pathlib import Path
 
-from lazylines import read_csv, read_jsonl
+import pytest
+
+from lazylines import Checkpoint, LazyLines, follow_jsonl, read_csv, read_jsonl, read_parquet
+from lazylines.functions import calc_mean, count
 
 
 def test_read_csv_local(tmp_path):
@@ -39,3 +42,99 @@ def test_read_jsonl_local():
     jsonl_path = Path(__file__).parent / "pokemon.jsonl"
     result = read_jsonl(jsonl_path).head(3).collect()
     assert len(result) == 3
+
+
+def test_read_jsonl_checkpoint(tmp_path):
+    """Only newly appended lines are processed when a checkpoint is passed."""
+    jsonl_file = tmp_path / "annotations.jsonl"
+    checkpoint_file = tmp_path / "checkpoint.json"
+    jsonl_file.write_text('{"user": "a", "n": 1}\n{"user": "b", "n": 2}\n{"user": "a"')
+
+    checkpoint = Checkpoint(checkpoint_file)
+    out = read_jsonl(jsonl_file, checkpoint=checkpoint).agg(calc_mean("n"), count(), checkpoint=checkpoint)
+    assert out == {"mean_n": 1.5, "count": 2}
+
+    # The partially written line is completed and another one is appended.
+    with open(jsonl_file, "a") as f:
+        f.write(', "n": 3}\n{"user": "c", "n": 4}\n')
+    checkpoint = Checkpoint(checkpoint_file)
+    out = read_jsonl(jsonl_file, checkpoint=checkpoint).agg(calc_mean("n"), count(), checkpoint=checkpoint)
+    assert out == {"mean_n": 2.5, "count": 4}
+    assert checkpoint.offset == jsonl_file.stat().st_size
+
+
+def test_nest_by_checkpoint(tmp_path):
+    """Groups from earlier runs are restored from the checkpoint."""
+    jsonl_file = tmp_path / "annotations.jsonl"
+    jsonl_file.write_text('{"user": "a", "n": 1}\n{"user": "b", "n": 2}\n')
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    read_jsonl(jsonl_file, checkpoint=checkpoint).nest_by("user", checkpoint=checkpoint)
+
+    with open(jsonl_file, "a") as f:
+        f.write('{"user": "a", "n": 3}\n')
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    result = read_jsonl(jsonl_file, checkpoint=checkpoint).nest_by("user", checkpoint=checkpoint).collect()
+    assert result == [{"user": "a", "subset": [{"n": 1}, {"n": 3}]}, {"user": "b", "subset": [{"n": 2}]}]
+
+
+def test_follow_jsonl(tmp_path):
+    """Following a file yields complete lines and stops after the timeout."""
+    jsonl_file = tmp_path / "annotations.jsonl"
+    jsonl_file.write_text('{"n": 1}\n{"n": 2}\n{"n": ')
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    result = follow_jsonl(jsonl_file, checkpoint=checkpoint, poll_interval=0.01, timeout=0.05).collect()
+    assert result == [{"n": 1}, {"n": 2}]
+    assert checkpoint.offset == len('{"n": 1}\n{"n": 2}\n')
+
+
+def test_parquet_roundtrip(tmp_path):
+    """Writing and reading Parquet files happens in batches and supports column pruning."""
+    pa = pytest.importorskip("pyarrow")
+    parquet_file = tmp_path / "data.parquet"
+    data = [{"a": i, "b": str(i), "c": i % 2 == 0} for i in range(25)]
+
+    batches = list(LazyLines(iter(data)).to_arrow_batches(batch_size=10))
+    assert [b.num_rows for b in batches] == [10, 10, 5]
+
+    LazyLines(iter(data)).write_parquet(parquet_file, row_group_size=10)
+    assert pa.parquet.ParquetFile(parquet_file).num_row_groups == 3
+    assert read_parquet(parquet_file, batch_size=7).collect() == data
+    assert read_parquet(parquet_file, columns=["a"]).head(2).collect() == [{"a": 0}, {"a": 1}]
+
+
+def test_agg_checkpoint_slots(tmp_path):
+    """Different aggregations that share a checkpoint keep their own state."""
+    jsonl_file = tmp_path / "annotations.jsonl"
+    jsonl_file.write_text('{"n": 1}\n{"n": 2}\n')
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    lines1, lines2 = read_jsonl(jsonl_file, checkpoint=checkpoint).tee()
+    assert lines1.agg(count(), checkpoint=checkpoint) == {"count": 2}
+    assert lines2.agg(calc_mean("n"), checkpoint=checkpoint) == {"mean_n": 1.5}
+
+    with open(jsonl_file, "a") as f:
+        f.write('{"n": 3}\n')
+    # Saving once after both stages means a crash in between doesn't skip lines for the second one.
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    lines1, lines2 = read_jsonl(jsonl_file, checkpoint=checkpoint).tee()
+    assert lines1.agg(count(), checkpoint=checkpoint, save=False) == {"count": 3}
+    assert Checkpoint(tmp_path / "checkpoint.json").offset == len('{"n": 1}\n{"n": 2}\n')
+    assert lines2.agg(calc_mean("n"), checkpoint=checkpoint, save=False) == {"mean_n": 2}
+    checkpoint.save()
+    assert Checkpoint(tmp_path / "checkpoint.json").offset == jsonl_file.stat().st_size
+
+
+def test_arrow_batches_schema_mismatch():
+    """Later batches that don't fit the inferred schema raise instead of losing data."""
+    pa = pytest.importorskip("pyarrow")
+    with pytest.raises(ValueError, match="'b'"):
+        list(LazyLines([{"a": 1}] * 3 + [{"a": 2, "b": "x"}]).to_arrow_batches(batch_size=3))
+    with pytest.raises(ValueError, match="schema"):
+        list(LazyLines([{"a": 1, "b": None}, {"a": 2, "b": "x"}]).to_arrow_batches(batch_size=1))
+    with pytest.raises(ValueError, match="infer"):
+        list(LazyLines([{"a": 1}, {"a": "x"}]).to_arrow_batches())
+    with pytest.raises(ValueError, match="schema"):
+        list(LazyLines([{"a": [1]}, {"a": {"x": 1}}]).to_arrow_batches(batch_size=1))
+
+    schema = pa.schema([("a", pa.int64()), ("b", pa.string())])
+    batches = LazyLines([{"a": 1}, {"a": 2, "b": "x"}]).to_arrow_batches(batch_size=1, schema=schema)
+    assert [b.to_pylist() for b in batches] == [[{"a": 1, "b": None}], [{"a": 2, "b": "x"}]]
@@ -1,8 +1,11 @@
 from pprint import pprint
 
 import pytest
+from pydantic import BaseModel, PositiveInt, ValidationError, field_validator
 
-from lazylines import LazyLines
+from lazylines import LazyLines, parallel
+from lazylines.functions import calc_mean, count
+from lazylines.parallel import parallel_agg
 
 
 @pytest.fixture
@@ -43,3 +46,116 @@ def test_nest(data):
         assert "b" not in item
         assert "c" in item
         assert "d" in item
+
+
+def test_window_streams_closed_windows():
+    def stream():
+        for ts in range(0, 86400 * 3, 600):
+            yield {"ts": ts, "value": 1}
+        raise AssertionError("The first window should be yielded before the stream is exhausted.")
+
+    first = next(iter(LazyLines(stream()).window("ts", every="1d", aggs=[calc_mean("value"), count()])))
+    assert first == {"window_start": 0, "window_end": 86400, "mean_value": 1, "count": 144}
+
+
+def test_window_requires_ordered_timestamps():
+    with pytest.raises(ValueError):
+        LazyLines([{"ts": 10}, {"ts": 5}]).window("ts", every=5).collect()
+    with pytest.raises(ValueError):
+        LazyLines([{"ts": 10}]).window("ts", every="1 hour").collect()
+
+
+def test_validate_on_error():
+    class Example(BaseModel):
+        a: PositiveInt
+
+    def items():
+        return ({"a": i - 3} for i in range(10))
+
+    skipped = LazyLines(items()).validate(Example, batch_size=2, on_error="skip").collect()
+    assert skipped == [{"a": i} for i in range(1, 7)]
+
+    with pytest.raises(ValidationError):
+        LazyLines(items()).validate(Example, batch_size=2).collect()
+    with pytest.raises(ValueError):
+        LazyLines(items()).validate(Example, on_error="collect")
+
+
+def skewed():
+    return ({"annotator": "power" if i % 5 < 2 else f"user{i % 13}", "i": i} for i in range(2000))
+
+
+def test_agg_parallel_matches_agg(monkeypatch):
+    expected = LazyLines(skewed()).agg(calc_mean("i"), count("annotator"))
+
+    # Pretend there are enough cores, so that the pool is used even on a single core machine.
+    calls = []
+
+    def spy(*args, **kwargs):
+        calls.append(kwargs)
+        return parallel_agg(*args, **kwargs)
+
+    monkeypatch.setattr(parallel, "_available_cores", lambda: 4)
+    monkeypatch.setattr(parallel, "parallel_agg", spy)
+    assert LazyLines(skewed()).agg(calc_mean("i"), count("annotator"), n_jobs=2) == expected
+    assert calls == [{"n_jobs": 2}]
+
+    accumulators = dict([calc_mean("i"), count()])
+    merged = parallel_agg(skewed(), accumulators, n_jobs=3, chunk_size=150)
+    assert merged["mean_i"].n == merged["count"].accum == 2000
+    assert merged["mean_i"].accum / merged["mean_i"].n == expected["mean_i"]
+    assert accumulators["count"].accum == 0
+    assert parallel_agg(iter([]), accumulators, n_jobs=2) == {}
+
+
+def test_window_sliding():
+    data = [{"ts": ts, "value": 1} for ts in (0, 30, 60, 90, 150)]
+    result = LazyLines(data).window("ts", every=60, period=120, aggs=[count()]).collect()
+    assert [(d["window_start"], d["window_end"], d["count"]) for d in result] == [
+        (-60, 60, 2),
+        (0, 120, 4),
+        (60, 180, 3),
+        (120, 240, 1),
+    ]
+
+
+def test_window_offset():
+    monday = 1545609600  # 2018-12-24 00:00 UTC
+    data = [{"ts": monday + 3600}, {"ts": monday + 86400 * 6}]
+    thursdays = LazyLines(data).window("ts", every="1w", aggs=[count()]).collect()
+    assert [d["count"] for d in thursdays] == [1, 1]
+    mondays = LazyLines(data).window("ts", every="1w", offset="4d", aggs=[count()]).collect()
+    assert mondays == [{"window_start": monday, "window_end": monday + 86400 * 7, "count": 2}]
+    assert LazyLines(data).window("ts", every="1w", offset="0s", aggs=[count()]).collect() == thursdays
+
+
+def test_validate_invalid_batches_and_stream_before_error():
+    calls = []
+
+    class Example(BaseModel):
+        a: int
+
+        @field_validator("a")
+        @classmethod
+        def positive(cls, v):
+            calls.append(v)
+            if v <= 0:
+                raise ValueError("must be positive")
+            return v
+
+    errors = []
+    items = [{"a": i} for i in (1, 2, -1, 3)]
+    assert LazyLines(items).validate(Example, on_error="collect", errors=errors).collect() == [{"a": 1}, {"a": 2}, {"a": 3}]
+    # Only the valid examples of a batch with an invalid one are validated again.
+    assert calls == [1, 2, -1, 3, 1, 2, 3]
+    assert errors == [{"item": {"a": -1}, "errors": [errors[0]["errors"][0]]}]
+    assert errors[0]["errors"][0]["loc"] == ("a",)
+
+    calls.clear()
+    assert LazyLines(items).validate(Example, on_error="skip").collect() == [{"a": 1}, {"a": 2}, {"a": 3}]
+    assert calls == [1, 2, -1, 3]
+
+    stream = iter(LazyLines(items).validate(Example))
+    assert [next(stream), next(stream)] == [{"a": 1}, {"a": 2}]
+    with pytest.raises(ValidationError):
+        next(stream)